@@ -1,44 +1,210 @@
 import os
 import sys
-import ffmpeg
 import subprocess
-from dotenv import load_dotenv
 from pathlib import Path
-from google import genai #google-genai
+from dataclasses import dataclass
 import json
+import orjson
+import re
 import time
+import asyncio
+import codecs
+import functools
+import hashlib
+import itertools
+import shelve
+import tempfile
+import queue
+import threading
+from collections import deque
+from collections.abc import AsyncIterable, AsyncIterator, Iterable, Iterator
+from typing import BinaryIO
 
-_TMP_FILE = "temp_subtitle.srt"
-_last_request_time = 0
-_GEMINI_MIN_REQUEST_INTERVAL = 60/15  # requests per minute)
+_GEMINI_MODEL = "gemini-2.0-flash"
+_GEMINI_REQUESTS_PER_MINUTE = 15
+_CACHE_DIR = Path.home() / '.cache' / 'subtranslator'
+_RATE_LIMIT_STATE_FILE = _CACHE_DIR / 'ratelimit.json'
+_RESPONSE_CACHE_FILE = _CACHE_DIR / 'responses'
+# Enough batches in flight to keep the RPM budget busy while responses take ~20 seconds
+_MAX_CONCURRENT_BATCHES = max(1, _GEMINI_REQUESTS_PER_MINUTE // 3)
+_GEMINI_BATCH_JOB_POLL_INTERVAL = 30
+_GEMINI_BATCH_JOB_DONE_STATES = ('JOB_STATE_SUCCEEDED', 'JOB_STATE_FAILED', 'JOB_STATE_CANCELLED', 'JOB_STATE_EXPIRED')
+# Batch jobs queue for minutes, so tiny files are faster through the synchronous API
+_BATCH_JOB_MIN_BATCHES = 5
+_TRANSLATION_CACHE_FILE = "xlate_cache.json"
+# Input tokens per batch, small enough that the translated array fits in the output limit
+_BATCH_TARGET_TOKENS = 3000
+# Long arrays are what the LLM most often answers with the wrong length
+_BATCH_MAX_ENTRIES = 50
+# Bytes read from the ffmpeg pipe at once
+_STREAM_CHUNK_SIZE = 65536
+# Batches extracted ahead of the translation dispatcher
+_STREAM_QUEUE_SIZE = 4
 
-def gemini_request(api_key: str, model: str, content: str) -> str:
+# Translations keyed by normalized source text, shared by all batches of a run
+_translation_cache: dict[str, str] = {}
+_translations_in_flight: dict[str, asyncio.Future] = {}
+# LLM responses keyed by (model, prompt) hash, so an interrupted run resumes without re-billing
+_response_cache = None
+
+class RateLimiter:
+    """
+    Async sliding window limiter allowing at most `max_requests` per `period` seconds
+
+    Request times are persisted to `state_file` so consecutive runs share the budget.
+    """
+    def __init__(self, max_requests: int, period: float, state_file: Path):
+        self.max_requests = max_requests
+        self.period = period
+        self.state_file = state_file
+        self._timestamps = None
+        self._lock = None
+
+    def _load(self) -> deque:
+        """Read persisted wall clock timestamps and convert them to the monotonic clock"""
+        offset = time.monotonic() - time.time()
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                timestamps = sorted(t + offset for t in json.load(f)
+                                    if isinstance(t, (int, float)) and not isinstance(t, bool))
+        except (OSError, ValueError, TypeError):
+            timestamps = []
+        return deque(timestamps[-self.max_requests:], maxlen=self.max_requests)
+
+    def _save(self):
+        offset = time.time() - time.monotonic()
+        try:
+            self.state_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.state_file, 'w', encoding='utf-8') as f:
+                json.dump([t + offset for t in self._timestamps], f)
+        except OSError as e:
+            print(f"Warning: Could not save rate limit state {self.state_file}: {str(e)}")
+
+    async def acquire(self):
+        # Create the lock lazily so it belongs to the running event loop
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            if self._timestamps is None:
+                self._timestamps = self._load()
+
+            if len(self._timestamps) == self.max_requests:
+                wait_time = self._timestamps[0] + self.period - time.monotonic()
+                if wait_time > 0:
+                    await asyncio.sleep(wait_time)
+
+            self._timestamps.append(time.monotonic())
+            self._save()
+
+_gemini_rate_limiter = RateLimiter(_GEMINI_REQUESTS_PER_MINUTE, 60, _RATE_LIMIT_STATE_FILE)
+
+@functools.lru_cache(maxsize=4)
+def _gemini_client(api_key: str):
+    """Reuse one client, and its connection pool, per API key"""
+    # Imported here because google-genai takes hundreds of milliseconds to load
+    from google import genai #google-genai
+
+    return genai.Client(api_key=api_key)
+
+async def gemini_request(api_key: str, model: str, content: str) -> str:
     """Send a request to the Gemini API with rate limiting
     """
-    global _last_request_time
-    
-    # Calculate time to wait
-    now = time.time()
-    time_since_last = now - _last_request_time
-    if time_since_last < _GEMINI_MIN_REQUEST_INTERVAL:
-        wait_time = _GEMINI_MIN_REQUEST_INTERVAL - time_since_last
-        time.sleep(wait_time)
-    
+    await _gemini_rate_limiter.acquire()
+
     # Make the request
-    client = genai.Client(api_key=api_key)
-    response = client.models.generate_content(model=model, contents=content)
-    
-    # Update last request time
-    _last_request_time = time.time()
-    
+    client = _gemini_client(api_key)
+    response = await client.aio.models.generate_content(model=model, contents=content)
+
     return response.text
 
-def llm_request(config, content: str) -> str:
+async def gemini_batch_job(api_key: str, model: str, contents: list[str]) -> list[str | None]:
+    """Run the requests as one Gemini batch job and wait for it to finish
+    """
+    await _gemini_rate_limiter.acquire()
+
+    client = _gemini_client(api_key)
+    job = await client.aio.batches.create(
+        model=model,
+        src=[{'contents': [{'parts': [{'text': content}], 'role': 'user'}]} for content in contents],
+    )
+    print(f"Submitted batch job {job.name} with {len(contents)} requests")
+
+    while job.state.name not in _GEMINI_BATCH_JOB_DONE_STATES:
+        await asyncio.sleep(_GEMINI_BATCH_JOB_POLL_INTERVAL)
+        job = await client.aio.batches.get(name=job.name)
+        print(f"Batch job {job.name}: {job.state.name}")
+
+    if job.state.name != 'JOB_STATE_SUCCEEDED':
+        raise ValueError(f"Error: Batch job {job.name} finished with state {job.state.name}")
+
+    return [
+        inlined.response.text if inlined.response else None
+        for inlined in job.dest.inlined_responses
+    ]
+
+def llm_model(config) -> str:
+    """Return the model used for the configured provider, rejecting unsupported providers"""
     if config['provider'] == 'gemini':
-        return gemini_request(config['api_key'], "gemini-2.0-flash", content)
+        return _GEMINI_MODEL
     else:
         raise ValueError(f"Unsupported model: {config['provider']}")
 
+def _response_cache_key(model: str, content: str) -> str:
+    return hashlib.blake2b(model.encode() + content.encode()).hexdigest()
+
+def open_response_cache():
+    """Open the on-disk cache of LLM responses shared by all runs"""
+    global _response_cache
+
+    try:
+        _RESPONSE_CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        _response_cache = shelve.open(os.fspath(_RESPONSE_CACHE_FILE))
+    except Exception as e:
+        print(f"Warning: Could not open response cache {_RESPONSE_CACHE_FILE}: {str(e)}")
+        _response_cache = None
+
+def close_response_cache():
+    global _response_cache
+
+    if _response_cache is not None:
+        _response_cache.close()
+        _response_cache = None
+
+def forget_response(config, content: str):
+    """Drop a cached response that turned out to be unusable, so retries reach the API"""
+    if _response_cache is not None:
+        _response_cache.pop(_response_cache_key(llm_model(config), content), None)
+
+async def llm_request(config, content: str) -> str:
+    model = llm_model(config)
+    key = _response_cache_key(model, content)
+    if _response_cache is not None and key in _response_cache:
+        return _response_cache[key]
+
+    # llm_model has already rejected unsupported providers
+    response = await gemini_request(config['api_key'], model, content)
+
+    if _response_cache is not None and response:
+        _response_cache[key] = response
+    return response
+
+async def llm_batch_job(config, contents: list[str]) -> list[str | None]:
+    model = llm_model(config)
+    keys = [_response_cache_key(model, content) for content in contents]
+    cache = _response_cache if _response_cache is not None else {}
+
+    # Only submit the requests that have no cached response
+    missing = [idx for idx, key in enumerate(keys) if key not in cache]
+    if missing:
+        # llm_model has already rejected unsupported providers
+        responses = await gemini_batch_job(config['api_key'], model, [contents[idx] for idx in missing])
+
+        for idx, response in zip(missing, responses):
+            if response:
+                cache[keys[idx]] = response
+
+    return [cache.get(key) for key in keys]
 
 def create_default_config():
     """Create default .env file if it doesn't exist in the script's directory"""
@@ -46,10 +212,12 @@ def create_default_config():
     env_path = script_dir / '.env'
     if not env_path.exists():
         with open(env_path, 'w') as f:
-            f.write("PROVIDER=gemini\nAPI_KEY=enterkey\nLANGUAGE=russian")
+            f.write("PROVIDER=gemini\nAPI_KEY=enterkey\nLANGUAGE=russian\nMODE=sync")
 
 def load_config():
     """Load configuration from .env file"""
+    from dotenv import load_dotenv
+
     script_dir = Path(__file__).parent
     env_path = script_dir / '.env'
     create_default_config()
@@ -58,7 +226,8 @@ def load_config():
     config = {
         'provider': os.getenv('PROVIDER', 'gemini'),
         'api_key': os.getenv('API_KEY', 'enterkey'),
-        'language': os.getenv('LANGUAGE', 'russian')
+        'language': os.getenv('LANGUAGE', 'russian'),
+        'mode': os.getenv('MODE', 'sync')
     }
     
     if config['api_key'] == 'enterkey':
@@ -66,11 +235,18 @@ def load_config():
     
     return config
 
+_CURLY_BRACE_PATTERN = re.compile(r'\{[^}]*\}')
+_WHITESPACE_PATTERN = re.compile(r'\s+')
+# Texts made only of music cues, sound descriptions, numbers or URLs are kept as is
+_SKIP_PATTERN = re.compile(
+    r'^(?:\s*(?:♪[^♪]*♪|\[[^\]]*\]|\d+(?:[.,:]\d+)*(?!\d)|https?://\S+(?=\s|$)))*\s*$'
+)
+
+@dataclass(slots=True)
 class SubtitleEntry:
-    def __init__(self, number: str, timeline: str, text: str):
-        self.number = number
-        self.timeline = timeline
-        self.text = text
+    number: str
+    timeline: str
+    text: str
 
 def parse_subtitles(subtitle_text: str) -> list[SubtitleEntry]:
     """
@@ -86,63 +262,136 @@ def parse_subtitles(subtitle_text: str) -> list[SubtitleEntry]:
     """
 
     entries = []
-    current_entry = {'number': '', 'timeline': '', 'text': []}
+    number = timeline = ''
+    text = []
     
     for line in subtitle_text.split('\n'):
         line = line.strip()
         if not line:
-            if current_entry['number']:  # Complete entry found
-                entries.append(SubtitleEntry(
-                    current_entry['number'],
-                    current_entry['timeline'],
-                    '\n'.join(current_entry['text'])
-                ))
-                current_entry = {'number': '', 'timeline': '', 'text': []}
+            if number:  # Complete entry found
+                entries.append(SubtitleEntry(number, timeline, '\n'.join(text)))
+                number = timeline = ''
+                text = []
         elif '-->' in line:
-            current_entry['timeline'] = line
+            timeline = line
         elif line.isdigit():
-            current_entry['number'] = line
+            number = line
         else:
-            current_entry['text'].append(line)
+            text.append(line)
     
     # Add the last entry if exists
-    if current_entry['number']:
-        entries.append(SubtitleEntry(
-            current_entry['number'],
-            current_entry['timeline'],
-            '\n'.join(current_entry['text'])
-        ))
+    if number:
+        entries.append(SubtitleEntry(number, timeline, '\n'.join(text)))
     
     return entries
 
+def _extract_subtitle_command(mkv_file, stream_index) -> list[str]:
+    """Build the ffmpeg command that writes the subtitle track as SRT to stdout"""
+    return [
+        'ffmpeg', '-loglevel', 'error', '-i', mkv_file,
+        '-map', f'0:{stream_index}',
+        '-f', 'srt', 'pipe:1'
+    ]
+
 def extract_subtitle(mkv_file, stream_index):
     try:
+        # Stream the subtitle track straight to stdout instead of a temp file
+        result = subprocess.run(_extract_subtitle_command(mkv_file, stream_index),
+                                check=True, capture_output=True)
 
-        output_file = _TMP_FILE
-        if os.path.exists(output_file):
-            os.remove(output_file) 
-
-        subprocess.run([
-            'ffmpeg', '-i', mkv_file,
-            '-map', f'0:{stream_index}',
-            output_file
-        ], check=True, capture_output=True)
-        
-        with open(output_file, 'r', encoding='utf-8') as f:
-            subtitle_text = f.read()
-        return subtitle_text
+        return result.stdout.decode('utf-8')
     except Exception as e:
         print(f"Error extracting subtitle: {str(e)}")
         sys.exit(1)
 
+def stream_entries(stream: BinaryIO, chunk_size: int = _STREAM_CHUNK_SIZE) -> Iterator[SubtitleEntry]:
+    """
+    Parse SRT output as it arrives and yield each entry once the blank line after it is read
+
+    Every chunk is handed to parse_subtitles up to the last complete entry; the incomplete
+    tail is kept for the next chunk.
+
+    Args:
+        stream: Binary stream of UTF-8 encoded SRT text, e.g. a subprocess pipe
+        chunk_size: Maximum number of bytes read at once
+
+    Returns:
+        Iterator of SubtitleEntry objects
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    pending = ''
+    while chunk := stream.read1(chunk_size):
+        pending += decoder.decode(chunk)
+        end = max(pending.rfind('\n\n'), pending.rfind('\n\r\n'))
+        if end >= 0:
+            yield from parse_subtitles(pending[:end + 1])
+            pending = pending[end + 1:]
+
+    pending += decoder.decode(b'', final=True)
+    yield from parse_subtitles(pending)
+
+async def stream_batches(mkv_file, stream_index, subtitle_entries: list[SubtitleEntry],
+                         batch_tokens: int = _BATCH_TARGET_TOKENS) -> AsyncIterator[list[str]]:
+    """
+    Extract the subtitle track and yield batches of subtitle texts while ffmpeg is still running
+
+    The original subtitles are saved as soon as extraction finishes, before the
+    batches are necessarily translated.
+
+    Args:
+        mkv_file: Path to the MKV file
+        stream_index: Index of the subtitle stream to extract
+        subtitle_entries: List that the parsed and cleaned entries are appended to
+        batch_tokens: Estimated number of input tokens per batch
+
+    Returns:
+        Async iterator of batches, where each batch is a list of subtitle texts
+    """
+    batch_queue = queue.Queue(maxsize=_STREAM_QUEUE_SIZE)
+
+    def produce():
+        try:
+            # stderr goes to a file so a chatty ffmpeg cannot block on a full pipe
+            with tempfile.TemporaryFile() as stderr_file, \
+                    subprocess.Popen(_extract_subtitle_command(mkv_file, stream_index),
+                                     stdout=subprocess.PIPE, stderr=stderr_file) as proc:
+                def cleaned_entries():
+                    for entry in stream_entries(proc.stdout):
+                        remove_curly_brace_content([entry])
+                        subtitle_entries.append(entry)
+                        yield entry
+
+                for batch in iter_batches(cleaned_entries(), batch_tokens):
+                    batch_queue.put(batch)
+
+                if proc.wait() != 0:
+                    stderr_file.seek(0)
+                    raise subprocess.CalledProcessError(proc.returncode, proc.args, stderr=stderr_file.read())
+            batch_queue.put(None)
+        except Exception as e:
+            batch_queue.put(e)
+
+    threading.Thread(target=produce, daemon=True).start()
+
+    while True:
+        batch = await asyncio.to_thread(batch_queue.get)
+        if batch is None:
+            save_original_subtitles(subtitle_entries, mkv_file)
+            return
+        if isinstance(batch, Exception):
+            raise batch
+        yield batch
+
 def list_subtitles(mkv_file):
     try:
-        # Get media information using ffprobe
-        probe = ffmpeg.probe(mkv_file)
-        
-        # Find all subtitle streams
-        subtitle_streams = [stream for stream in probe['streams'] 
-                          if stream['codec_type'] == 'subtitle']
+        # Let ffprobe select the subtitle streams and report only the fields we need
+        result = subprocess.run([
+            'ffprobe', '-v', 'error',
+            '-select_streams', 's',
+            '-show_entries', 'stream=index,codec_name:stream_tags=language,title',
+            '-of', 'json', mkv_file
+        ], check=True, capture_output=True)
+        subtitle_streams = json.loads(result.stdout).get('streams', [])
         
         if not subtitle_streams:
             print("No subtitle tracks found")
@@ -172,36 +421,147 @@ def list_subtitles(mkv_file):
         print("Error: An error occurred while listing subtitle tracks")
         sys.exit(1)
 
-def batch_subtitles(subtitle_entries: list[SubtitleEntry], batch_size: int = 10) -> list[list[str]]:
+def is_translatable(text: str) -> bool:
+    """Check whether a subtitle text has anything for the LLM to translate"""
+    return _SKIP_PATTERN.match(text) is None
+
+def estimate_tokens(text: str) -> int:
+    """Roughly estimate the number of LLM tokens a text takes as an item of the JSON request array"""
+    # Quotes and escapes come from the encoded item, plus one separating comma
+    return max(1, (len(orjson.dumps(text)) + 1) // 4)
+
+def iter_batches(subtitle_entries: Iterable[SubtitleEntry], batch_tokens: int = _BATCH_TARGET_TOKENS,
+                 max_entries: int = _BATCH_MAX_ENTRIES) -> Iterator[list[str]]:
     """
-    Split subtitle entries into batches and extract their text content
+    Split subtitle entries into batches and extract their text content as the entries arrive
+
+    Entries that need no translation (see is_translatable) are left out of the batches.
     
     Args:
-        subtitle_entries: List of SubtitleEntry objects
-        batch_size: Number of subtitle texts per batch
+        subtitle_entries: Iterable of SubtitleEntry objects
+        batch_tokens: Estimated number of input tokens per batch
+        max_entries: Maximum number of subtitle texts per batch
         
     Returns:
-        List of batches, where each batch is a list of subtitle texts
+        Iterator of batches, where each batch is a list of subtitle texts
     """
-    batches = []
     current_batch = []
+    current_tokens = 0
     
     for entry in subtitle_entries:
-        current_batch.append(entry.text)
+        if not is_translatable(entry.text):
+            continue
+
+        entry_tokens = estimate_tokens(entry.text)
         
-        if len(current_batch) >= batch_size:
-            batches.append(current_batch)
+        # Close the batch before it would exceed the token budget or the entry cap
+        if current_batch and (current_tokens + entry_tokens > batch_tokens
+                              or len(current_batch) >= max_entries):
+            yield current_batch
             current_batch = []
+            current_tokens = 0
+        
+        current_batch.append(entry.text)
+        current_tokens += entry_tokens
     
     # Add the remaining entries if any
     if current_batch:
-        batches.append(current_batch)
+        yield current_batch
+
+def batch_subtitles(subtitle_entries: list[SubtitleEntry], batch_tokens: int = _BATCH_TARGET_TOKENS) -> list[list[str]]:
+    """
+    Split subtitle entries into batches and extract their text content
     
-    return batches
+    Args:
+        subtitle_entries: List of SubtitleEntry objects
+        batch_tokens: Estimated number of input tokens per batch
+        
+    Returns:
+        List of batches, where each batch is a list of subtitle texts
+    """
+    return list(iter_batches(subtitle_entries, batch_tokens))
+
+def parse_batch_response(response: str, batch: list[str]) -> list[str] | None:
+    """
+    Extract the translated JSON array from an LLM response
+
+    Args:
+        response: Raw text returned by the LLM API
+        batch: List of subtitle texts that were sent
 
-def process_batch(batch: list[str], config: dict) -> list[str]:
+    Returns:
+        List of translated texts, or None if the response is unusable
+    """
+    cleaned_response = response[response.find('['):response.rfind(']') + 1]
+    # Parse the JSON response
+    try:
+        translated_texts = orjson.loads(cleaned_response)
+    except orjson.JSONDecodeError:
+        print("Error: Failed to decode JSON response. Retrying...")
+        return None
+
+    # Check if lengths match
+    if len(translated_texts) != len(batch):
+        print(f"Warning: Response length mismatch (got {len(translated_texts)}, expected {len(batch)}). Retrying...")
+        return None
+
+    return translated_texts
+
+def _cache_key(text: str) -> str:
+    """Normalize a subtitle text for translation cache lookups"""
+    return text.strip()
+
+def load_translation_cache(cache_file: Path, language: str):
+    """Load previously saved translations for the target language"""
+    global _translation_cache
+
+    _translation_cache = {}
+    if cache_file.exists():
+        try:
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                caches = json.load(f)
+            translations = caches.get(language, {}) if isinstance(caches, dict) else None
+            if not isinstance(translations, dict):
+                raise ValueError("unexpected file structure")
+            _translation_cache = translations
+        except (OSError, ValueError) as e:
+            print(f"Warning: Could not read translation cache {cache_file}: {str(e)}")
+    if _translation_cache:
+        print(f"Loaded {len(_translation_cache)} cached translations from {cache_file}")
+
+def save_translation_cache(cache_file: Path, language: str):
+    """Save translations for the target language, keeping other languages in the file"""
+    caches = {}
+    if cache_file.exists():
+        try:
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                caches = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            pass
+    if not isinstance(caches, dict):
+        caches = {}
+    caches[language] = _translation_cache
+
+    try:
+        with open(cache_file, 'w', encoding='utf-8') as f:
+            json.dump(caches, f, ensure_ascii=False)
+    except OSError as e:
+        print(f"Warning: Could not save translation cache {cache_file}: {str(e)}")
+
+def remember_translations(texts: list[str], translated_texts: list[str]):
+    """Store translations in the cache and wake up batches waiting for them"""
+    for text, translated in zip(texts, translated_texts):
+        _translation_cache[text] = translated
+        future = _translations_in_flight.pop(text, None)
+        if future is not None:
+            future.set_result(translated)
+
+async def process_batch(batch: list[str], config: dict) -> list[str]:
     """
     Process a batch of subtitle texts using the LLM API
+
+    Only texts that are neither cached nor being translated by another batch
+    are sent, each of them once.
     
     Args:
         batch: List of subtitle texts to process
@@ -212,35 +572,137 @@ def process_batch(batch: list[str], config: dict) -> list[str]:
     """
     max_retries = 3
     retry_count = 0
-    
-    while retry_count < max_retries:
-        # Create JSON array of texts
-        content = json.dumps(batch)
-        
-        # Make the API request
-        request = request_builder(content, config)
-        response = llm_request(config, request)
-        
-        if response:
-            cleaned_response = response[response.find('['):response.rfind(']') + 1]
-            # Parse the JSON response
-            try:
-                translated_texts = json.loads(cleaned_response)
-                
-                # Check if lengths match
-                if len(translated_texts) == len(batch):
-                    return translated_texts
-                else:
-                    print(f"Warning: Response length mismatch (got {len(translated_texts)}, expected {len(batch)}). Retrying...")
-                    retry_count += 1
-                    
-            except json.JSONDecodeError:
-                print("Error: Failed to decode JSON response. Retrying...")
+
+    texts = []
+    waiting = []
+    for key in dict.fromkeys(_cache_key(text) for text in batch):
+        if key in _translation_cache:
+            continue
+        if key in _translations_in_flight:
+            waiting.append(_translations_in_flight[key])
+        else:
+            _translations_in_flight[key] = asyncio.get_running_loop().create_future()
+            texts.append(key)
+
+    try:
+        while texts:
+            if retry_count >= max_retries:
+                raise Exception(f"Failed to get correct translation after {max_retries} attempts")
+
+            # Create JSON array of texts
+            content = orjson.dumps(texts).decode()
+            
+            # Make the API request
+            request = request_builder(content, config)
+            response = await llm_request(config, request)
+            
+            if response:
+                translated_texts = parse_batch_response(response, texts)
+                if translated_texts is not None:
+                    remember_translations(texts, translated_texts)
+                    break
+                forget_response(config, request)
                 retry_count += 1
+            else:
+                raise ValueError("Error: No response from LLM API")
+    except BaseException:
+        # Release the claimed texts so waiting batches do not hang
+        for key in texts:
+            future = _translations_in_flight.pop(key, None)
+            if future is not None:
+                future.cancel()
+        raise
+
+    await asyncio.gather(*waiting)
+    return [_translation_cache[_cache_key(text)] for text in batch]
+
+async def translate_batches(batches: Iterable[list[str]] | AsyncIterable[list[str]], config: dict) -> list[list[str]]:
+    """
+    Translate all batches concurrently, keeping at most _MAX_CONCURRENT_BATCHES in flight
+
+    Args:
+        batches: Batches of subtitle texts, either a list or an async iterator that
+                 yields them while they are still being extracted
+        config: Configuration dictionary with API settings
+
+    Returns:
+        List of translated batches in the same order as the input
+    """
+    semaphore = asyncio.Semaphore(_MAX_CONCURRENT_BATCHES)
+    start_time = time.time()
+    completed = 0
+    # Unknown while batches are still streaming in
+    total = None
+    tasks = []
+
+    async def run_batch(batch: list[str]) -> list[str]:
+        nonlocal completed
+        async with semaphore:
+            translated_texts = await process_batch(batch, config)
+
+        completed += 1
+        if total is None:
+            print(f"Translated batch {completed}, subtitles are still being extracted")
         else:
-            raise ValueError("Error: No response from LLM API")
-    
-    raise Exception(f"Failed to get correct translation after {max_retries} attempts")
+            remaining = total - completed
+            estimated_time = (time.time() - start_time) / completed * remaining
+            est_minutes = int(estimated_time // 60)
+            est_seconds = int(estimated_time % 60)
+            print(f"Translated batch {completed} of {total} Estimated time for remaining batches: {est_minutes} minutes {est_seconds} seconds")
+        return translated_texts
+
+    # Dispatch every batch as soon as it is available
+    if hasattr(batches, '__aiter__'):
+        async for batch in batches:
+            tasks.append(asyncio.create_task(run_batch(batch)))
+    else:
+        tasks.extend(asyncio.create_task(run_batch(batch)) for batch in batches)
+    total = len(tasks)
+
+    return await asyncio.gather(*tasks)
+
+async def submit_batch_job(batches: list[list[str]], config: dict) -> list[list[str]]:
+    """
+    Translate all batches as a single provider batch job
+
+    Batches whose response is missing or malformed are retried through the
+    synchronous path.
+
+    Args:
+        batches: List of batches of subtitle texts
+        config: Configuration dictionary with API settings
+
+    Returns:
+        List of translated batches in the same order as the input
+    """
+    # Send every uncached text once across the whole job
+    seen = set()
+    pending = []
+    for batch in batches:
+        texts = [key for key in dict.fromkeys(_cache_key(text) for text in batch)
+                 if key not in _translation_cache and key not in seen]
+        seen.update(texts)
+        if texts:
+            pending.append(texts)
+
+    if pending:
+        requests = [request_builder(orjson.dumps(texts).decode(), config) for texts in pending]
+        responses = await llm_batch_job(config, requests)
+
+        failed = []
+        for texts, request, response in zip(pending, requests, responses):
+            translated_texts = parse_batch_response(response, texts) if response else None
+            if translated_texts is None:
+                forget_response(config, request)
+                failed.append(texts)
+            else:
+                remember_translations(texts, translated_texts)
+
+        if failed:
+            print(f"Retrying {len(failed)} batches that failed in the batch job")
+            await translate_batches(failed, config)
+
+    return [[_translation_cache[_cache_key(text)] for text in batch] for batch in batches]
 
 def request_builder(content, config):
     req = f"""Task: 
@@ -256,16 +718,29 @@ def format_subtitle_entry(entry: SubtitleEntry) -> str:
     """Convert a SubtitleEntry to SRT format string"""
     return f"{entry.number}\n{entry.timeline}\n{entry.text}\n"
 
+def format_subtitles(entries: list[SubtitleEntry]) -> str:
+    """Convert SubtitleEntry objects to the full SRT file content"""
+    return ''.join(f"{format_subtitle_entry(entry)}\n" for entry in entries)
+
+def save_original_subtitles(entries: list[SubtitleEntry], mkv_file: str):
+    """Save the untranslated subtitle entries next to the MKV file in SRT format"""
+    original_subtitle_file = f"{os.path.splitext(mkv_file)[0]}.srt"
+    try:
+        with open(original_subtitle_file, 'w', encoding='utf-8') as f:
+            f.write(format_subtitles(entries))
+        print(f"Original subtitles saved to: {original_subtitle_file}")
+    except Exception as e:
+        print(f"Error saving original subtitles: {str(e)}")
+        sys.exit(1)
+
 def save_subtitles(config, entries: list[SubtitleEntry], mkv_file: str):
     """Save subtitle entries to a file in SRT format"""
     # Create output filename by replacing .mkv extension with .srt
-    output_file = Path(mkv_file).with_stem(f"{Path(mkv_file).stem}_{config['language']}").with_suffix('.srt')
+    output_file = f"{os.path.splitext(mkv_file)[0]}_{config['language']}.srt"
     
     try:
         with open(output_file, 'w', encoding='utf-8') as f:
-            for entry in entries:
-                f.write(format_subtitle_entry(entry))
-                f.write('\n')  # Extra newline between entries
+            f.write(format_subtitles(entries))
         print(f"Translated subtitles saved to: {output_file}")
     except Exception as e:
         print(f"Error saving subtitles: {str(e)}")
@@ -281,13 +756,11 @@ def remove_curly_brace_content(entries: list[SubtitleEntry]) -> list[SubtitleEnt
     Returns:
         List of SubtitleEntry objects with curly brace content removed
     """
-    import re
-    
     for entry in entries:
         # Remove all text within curly braces including the braces
-        entry.text = re.sub(r'\{[^}]*\}', '', entry.text)
+        entry.text = _CURLY_BRACE_PATTERN.sub('', entry.text)
         # Remove any extra whitespace that might be left
-        entry.text = re.sub(r'\s+', ' ', entry.text).strip()
+        entry.text = _WHITESPACE_PATTERN.sub(' ', entry.text).strip()
     
     return entries
 
@@ -318,65 +791,51 @@ def main():
     
     stream_index = list_subtitles(mkv_file)
     if stream_index is not None:
-        subtitle_text = extract_subtitle(mkv_file, stream_index)
-        subtitle_entries = parse_subtitles(subtitle_text)
-        
-        print("\nSubtitle content loaded successfully!")
-        
-        # Remove curly brace content from subtitles
-        subtitle_entries = remove_curly_brace_content(subtitle_entries)
-        
-        # Save the original subtitle entries to a file
-        original_subtitle_file = Path(mkv_file).with_suffix('.srt')
+        # Translations are shared by all files in the same directory, e.g. episodes of a series
+        cache_file = Path(mkv_file).parent / _TRANSLATION_CACHE_FILE
+        load_translation_cache(cache_file, config['language'])
+        open_response_cache()
         try:
-            with open(original_subtitle_file, 'w', encoding='utf-8') as f:
-                for entry in subtitle_entries:
-                    f.write(format_subtitle_entry(entry))
-                    f.write('\n')  # Extra newline between entries
-                print(f"Original subtitles saved to: {original_subtitle_file}")
-        except Exception as e:
-            print(f"Error saving original subtitles: {str(e)}")
-            sys.exit(1)
+            if config['mode'] == 'batch':
+                # A batch job needs every batch up front
+                subtitle_text = extract_subtitle(mkv_file, stream_index)
+                subtitle_entries = parse_subtitles(subtitle_text)
+                
+                print("\nSubtitle content loaded successfully!")
+                
+                # Remove curly brace content from subtitles
+                subtitle_entries = remove_curly_brace_content(subtitle_entries)
+                save_original_subtitles(subtitle_entries, mkv_file)
 
-        # Create batches of subtitle texts
-        batches = batch_subtitles(subtitle_entries, batch_size=50)
-        print(f"Created {len(batches)} batches of subtitles")
-        
-        translated_entries = []
-   
-        batch_execute_times_sec = []
-        for batch in batches:
-            if len(batch_execute_times_sec)==0:
-                print(f"Processing batch {batches.index(batch)+1} of {len(batches)}")
+                # Create batches of subtitle texts
+                batches = batch_subtitles(subtitle_entries)
+                print(f"Created {len(batches)} batches of subtitles")
+
+                if len(batches) >= _BATCH_JOB_MIN_BATCHES:
+                    batches_translated = asyncio.run(submit_batch_job(batches, config))
+                else:
+                    batches_translated = asyncio.run(translate_batches(batches, config))
             else:
-                extimated_time_for_one_batch = sum(batch_execute_times_sec)/len(batch_execute_times_sec)
-                estimated_time = extimated_time_for_one_batch * (len(batches) - len(batch_execute_times_sec))
-                est_minutes = int(estimated_time // 60)
-                est_seconds = int(estimated_time % 60)
-                print(f"Processing batch {batches.index(batch)+1} of {len(batches)} Estimated time for remaining batches: {est_minutes} minutes {est_seconds} seconds")
-            
-            start_time = time.time()
-            translated_texts = process_batch(batch, config)
-            end_time = time.time()
-            batch_execute_times_sec.append(end_time - start_time)
-
-            for id in range(len(batch)):
-                # Add the translated text to the corresponding entry
-                subtitle_entries[id].text = translated_texts[id]
-                translated_entries.append(subtitle_entries[id])
-            
-            # Remove the processed batch from the original list
-            subtitle_entries = subtitle_entries[len(batch):]
+                # Start translating batches while ffmpeg is still extracting the track
+                subtitle_entries = []
+                batches = stream_batches(mkv_file, stream_index, subtitle_entries)
+                batches_translated = asyncio.run(translate_batches(batches, config))
+                print(f"\nTranslated {len(subtitle_entries)} subtitles in {len(batches_translated)} batches")
+        except subprocess.CalledProcessError as e:
+            print(f"Error extracting subtitle: {str(e)}")
+            sys.exit(1)
+        finally:
+            close_response_cache()
+            save_translation_cache(cache_file, config['language'])
+        
+        # Assign translations in batch order, skipping the entries that were never batched
+        translated_texts = itertools.chain.from_iterable(batches_translated)
+        for entry in subtitle_entries:
+            if is_translatable(entry.text):
+                entry.text = next(translated_texts)
         
         # Save the translated subtitles
-        save_subtitles(config, translated_entries, mkv_file)
-
+        save_subtitles(config, subtitle_entries, mkv_file)
 
-    if os.path.exists(_TMP_FILE):
-        try:
-            os.remove(_TMP_FILE)
-        except Exception as e:
-            print(f"Warning: Could not remove temporary file {_TMP_FILE}: {str(e)}")
-            
 if __name__ == "__main__":
     main()
\ No newline at end of file